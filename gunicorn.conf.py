@@ -0,0 +1,12 @@
+import os
+
+# The workload is I/O-bound (two upstream HTTP calls per image), so threaded
+# workers give high concurrency without an async rewrite. WEB_CONCURRENCY is
+# the conventional knob on PaaS hosts like Render/Heroku.
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_class = "gthread"
+threads = 8
+
+# Keep upstream-facing connections open across requests (Render's proxy uses
+# long-lived connections)
+keepalive = 75